@@ -1,10 +1,11 @@
-import os, random, time
+import os, random, secrets, time, queue, threading, atexit, logging
+from concurrent.futures import Future, TimeoutError as FutureTimeout
 from datetime import datetime, timezone
 
 import streamlit as st
 import psycopg
-import pandas as pd
-import matplotlib.pyplot as plt
+from psycopg import sql
+from psycopg_pool import ConnectionPool
 
 # -----------------------------
 # Page setup
@@ -14,29 +15,72 @@ st.set_page_config(page_title="Yogurt Study", layout="centered")
 # -----------------------------
 # Constants
 # -----------------------------
+# Order is persisted: choice_code stores indices into this list (decoded by
+# the yogurt_variety_v view), so flavors may only be appended, never
+# reordered, removed or inserted.
 FLAVORS = ["Vanilla", "Strawberry", "Banana", "Blueberry", "Apricot", "Coffee"]
 PLACEHOLDER = "— select —"
 OPTIONS = [PLACEHOLDER] + FLAVORS
+FLAVOR_IDX = {f: i for i, f in enumerate(FLAVORS)}
 
 SHOW_RESULTS_TO_STUDENTS = True
 
+CONDITION_ORDER = ["sequential", "simultaneous"]
+VARIETY_ORDER = ["Low", "Medium", "High"]
+VARIETY_LABELS = {
+    "Low": "Low (3x same)",
+    "Medium": "Medium (2x same)",
+    "High": "High (3 different)",
+}
+
+# Background insert batching
+BATCH_MAX_ROWS = 100
+COPY_MIN_ROWS = 50
+SUBMIT_TIMEOUT_S = 2.0
+SHUTDOWN_TIMEOUT_S = 5.0
+_STOP = object()
+
+log = logging.getLogger(__name__)
+
 # -----------------------------
 # Helper functions
 # -----------------------------
 def classify_variety(choices):
-    u = len(set(choices))
-    return "Low" if u == 1 else ("Medium" if u == 2 else "High")
+    a, b, c = choices
+    if a == b == c:
+        return "Low"
+    if a != b and b != c and a != c:
+        return "High"
+    return "Medium"
+
+def encode_choices(choices):
+    """Pack three flavors into one base-6 integer (0..215)."""
+    a, b, c = (FLAVOR_IDX[f] for f in choices)
+    return a * 36 + b * 6 + c
 
 @st.cache_resource
-def get_conn():
+def get_pool():
+    # Resolved here rather than at module level: Streamlit re-executes the
+    # script on every rerun, while this cached function runs once per process.
     db_url = st.secrets.get("DATABASE_URL") or os.environ.get("DATABASE_URL")
     if not db_url:
         raise RuntimeError("DATABASE_URL missing")
-    return psycopg.connect(db_url, autocommit=True, sslmode="require")
+    return ConnectionPool(
+        db_url,
+        min_size=2,
+        max_size=10,
+        kwargs={"autocommit": True, "sslmode": "require"},
+        # Verify connections on checkout and retire idle ones before the
+        # server's idle timeout can kill them underneath us.
+        check=ConnectionPool.check_connection,
+        max_idle=300,
+        open=True,
+    )
 
+@st.cache_resource
 def init_db():
-    conn = get_conn()
-    with conn.cursor() as cur:
+    """Create the table once per process rather than on every rerun."""
+    with get_pool().connection() as conn, conn.cursor() as cur:
         cur.execute("""
         CREATE TABLE IF NOT EXISTS yogurt_variety (
             id BIGSERIAL PRIMARY KEY,
@@ -47,56 +91,225 @@ def init_db():
             variety TEXT NOT NULL
         );
         """)
+        # choices TEXT[] is superseded by choice_code; kept nullable for old rows.
+        cur.execute("""
+        ALTER TABLE yogurt_variety
+            ADD COLUMN IF NOT EXISTS choice_code SMALLINT,
+            ALTER COLUMN choices DROP NOT NULL;
+        """)
+        # Read view for analysis: choices decoded from choice_code for new
+        # rows, taken as stored for rows written before choice_code existed.
+        cur.execute(sql.SQL("""
+        CREATE OR REPLACE VIEW yogurt_variety_v AS
+        SELECT y.id, y.created_at, y.participant_id, y.condition,
+               COALESCE(y.choices, ARRAY[
+                   f.names[y.choice_code / 36 + 1],
+                   f.names[y.choice_code / 6 % 6 + 1],
+                   f.names[y.choice_code % 6 + 1]
+               ]) AS choices,
+               y.variety
+        FROM yogurt_variety AS y
+        CROSS JOIN (SELECT {flavors}::text[] AS names) AS f;
+        """).format(flavors=sql.Literal(FLAVORS)))
+        # One submission per participant; makes resubmits idempotent.
+        cur.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS yv_pid_idx
+        ON yogurt_variety (participant_id);
+        """)
+
+    # Per-cell counts kept current by an AFTER INSERT trigger, so reads never
+    # aggregate yogurt_variety.
+    with get_pool().connection() as conn, conn.transaction(), conn.cursor() as cur:
+        cur.execute("SELECT to_regclass('yv_counts') IS NULL")
+        (create_counts,) = cur.fetchone()
+        if create_counts:
+            # Block inserts until the trigger exists so the seed misses nothing.
+            cur.execute("LOCK TABLE yogurt_variety IN SHARE ROW EXCLUSIVE MODE;")
+            cur.execute("""
+            CREATE TABLE IF NOT EXISTS yv_counts (
+                condition TEXT NOT NULL,
+                variety TEXT NOT NULL,
+                n BIGINT NOT NULL,
+                PRIMARY KEY (condition, variety)
+            );
+            """)
+            cur.execute("""
+            INSERT INTO yv_counts (condition, variety, n)
+            SELECT condition, variety, COUNT(*)
+            FROM yogurt_variety
+            GROUP BY condition, variety
+            ON CONFLICT (condition, variety) DO NOTHING;
+            """)
+            cur.execute("""
+            INSERT INTO yv_counts (condition, variety, n)
+            SELECT c, v, 0
+            FROM unnest(ARRAY['sequential', 'simultaneous']) AS c,
+                 unnest(ARRAY['Low', 'Medium', 'High']) AS v
+            ON CONFLICT (condition, variety) DO NOTHING;
+            """)
+        cur.execute("""
+        CREATE OR REPLACE FUNCTION bump_yv() RETURNS TRIGGER AS $$
+        BEGIN
+            INSERT INTO yv_counts (condition, variety, n)
+            VALUES (NEW.condition, NEW.variety, 1)
+            ON CONFLICT (condition, variety) DO UPDATE SET n = yv_counts.n + 1;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """)
+        cur.execute("DROP TRIGGER IF EXISTS yv_counts_bump ON yogurt_variety;")
+        cur.execute("""
+        CREATE TRIGGER yv_counts_bump
+        AFTER INSERT ON yogurt_variety
+        FOR EACH ROW EXECUTE FUNCTION bump_yv();
+        """)
 
-def safe_insert(row, retries=6):
-    conn = get_conn()
+def write_rows(pool, rows, retries=6):
+    params = [
+        (r["created_at"], r["participant_id"],
+         r["condition"], r["choice_code"], r["variety"])
+        for r in rows
+    ]
     for i in range(retries):
         try:
-            with conn.cursor() as cur:
-                cur.execute(
-                    """
-                    INSERT INTO yogurt_variety
-                    (created_at, participant_id, condition, choices, variety)
-                    VALUES (%s, %s, %s, %s, %s)
-                    """,
-                    (row["created_at"], row["participant_id"],
-                     row["condition"], row["choices"], row["variety"])
-                )
+            # One transaction per batch, so a retry never re-sends rows
+            # that already committed.
+            with pool.connection() as conn, conn.transaction():
+                if len(params) >= COPY_MIN_ROWS:
+                    with conn.cursor() as cur, cur.copy(
+                        """
+                        COPY yogurt_variety
+                        (created_at, participant_id, condition, choice_code, variety)
+                        FROM STDIN (FORMAT BINARY)
+                        """
+                    ) as cp:
+                        cp.set_types(["timestamptz", "text", "text", "int2", "text"])
+                        for p in params:
+                            cp.write_row(p)
+                else:
+                    # executemany already pipelines the statements.
+                    with conn.cursor() as cur:
+                        cur.executemany(
+                            """
+                            INSERT INTO yogurt_variety
+                            (created_at, participant_id, condition, choice_code, variety)
+                            VALUES (%s, %s, %s, %s, %s)
+                            ON CONFLICT (participant_id) DO NOTHING
+                            """,
+                            params
+                        )
             return
-        except Exception:
+        except psycopg.OperationalError:
             if i == retries - 1:
                 raise
             time.sleep(0.2 * (2 ** i))
 
+def _write_batch(pool, rows):
+    """Write rows and return one exception (or None) per row."""
+    try:
+        write_rows(pool, rows)
+        return [None] * len(rows)
+    except psycopg.OperationalError as e:
+        # Retries exhausted: the database is unreachable, fail the whole batch.
+        log.exception("Insert of %d rows failed", len(rows))
+        return [e] * len(rows)
+    except psycopg.Error as e:
+        if len(rows) == 1:
+            log.exception("Rejected row for %s", rows[0]["participant_id"])
+            return [e]
+    # One bad row (or a participant_id already present, which COPY cannot
+    # skip) fails the whole batch; retry one at a time so only it is rejected.
+    errors = []
+    for row in rows:
+        try:
+            write_rows(pool, [row])
+            errors.append(None)
+        except psycopg.Error as e:
+            log.exception("Rejected row for %s", row["participant_id"])
+            errors.append(e)
+    return errors
+
+def _drain(q, pool):
+    """Collect queued rows and write them in batches of up to BATCH_MAX_ROWS."""
+    stopping = False
+    while not stopping:
+        # Flush as soon as the queue is empty: a lone submitter waits one
+        # round trip, and rows arriving during a write form the next batch.
+        items = []
+        item = q.get()
+        while item is not _STOP:
+            items.append(item)
+            if len(items) >= BATCH_MAX_ROWS:
+                break
+            try:
+                item = q.get_nowait()
+            except queue.Empty:
+                break
+        stopping = item is _STOP
+        # Skip rows whose submitter already gave up waiting (see safe_insert).
+        items = [(row, fut) for row, fut in items if fut.set_running_or_notify_cancel()]
+        if not items:
+            continue
+        rows = [row for row, _ in items]
+        try:
+            errors = _write_batch(pool, rows)
+        except Exception as e:
+            log.exception("Insert of %d rows failed", len(rows))
+            errors = [e] * len(rows)
+        if not all(errors):
+            fetch_counts.clear()
+        for (_, fut), err in zip(items, errors):
+            if err is None:
+                fut.set_result(True)
+            else:
+                fut.set_exception(err)
+
+def _stop_sender(q, t):
+    # Let the drain thread flush what is queued, but never hold up process
+    # exit for longer than SHUTDOWN_TIMEOUT_S (e.g. while the DB is down).
+    q.put(_STOP)
+    t.join(timeout=SHUTDOWN_TIMEOUT_S)
+
+@st.cache_resource
+def get_sender():
+    q = queue.Queue()
+    t = threading.Thread(target=_drain, args=(q, get_pool()), daemon=True)
+    t.start()
+    atexit.register(_stop_sender, q, t)
+    return q
+
+def safe_insert(row, timeout=SUBMIT_TIMEOUT_S):
+    """Queue row for the next batch and wait until it has been written.
+
+    Concurrent submitters share one flush. Raises the insert error, or
+    FutureTimeout if the batch is not written within timeout seconds. A
+    timed-out row is dropped if not yet picked up; if it was, it may still
+    commit, and a resubmit is a no-op thanks to ON CONFLICT (participant_id).
+    """
+    fut = Future()
+    get_sender().put((row, fut))
+    try:
+        fut.result(timeout=timeout)
+    except FutureTimeout:
+        fut.cancel()
+        raise
+
+@st.cache_data(ttl=5, show_spinner=False)
 def fetch_counts():
-    conn = get_conn()
-    with conn.cursor() as cur:
-        cur.execute("""
-            SELECT condition, variety, COUNT(*) AS n
-            FROM yogurt_variety
-            GROUP BY condition, variety
-        """)
-        rows = cur.fetchall()
-    return pd.DataFrame(rows, columns=["condition", "variety", "n"])
+    # Imported lazily so the submit-only path never loads pandas.
+    import pandas as pd
 
-def fetch_n_per_condition():
-    conn = get_conn()
-    with conn.cursor() as cur:
-        cur.execute("""
-            SELECT condition, COUNT(*) AS n
-            FROM yogurt_variety
-            GROUP BY condition
-        """)
+    with get_pool().connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT condition, variety, n FROM yv_counts")
         rows = cur.fetchall()
-    return {cond: n for cond, n in rows}
+    return pd.DataFrame(rows, columns=["condition", "variety", "n"])
 
 def assign_condition_balanced():
     """Adaptive randomization to keep cell sizes approximately equal."""
-    conn = get_conn()
-    with conn.cursor() as cur:
+    with get_pool().connection() as conn, conn.cursor() as cur:
         cur.execute("""
-            SELECT condition, COUNT(*)
-            FROM yogurt_variety
+            SELECT condition, SUM(n)::bigint AS n
+            FROM yv_counts
             GROUP BY condition
         """)
         rows = cur.fetchall()
@@ -112,77 +325,97 @@ def assign_condition_balanced():
     else:
         return random.choice(["sequential", "simultaneous"])
 
-def plot_stacked(df):
-    label_map = {
-        "Low": "Low (3x same)",
-        "Medium": "Medium (2x same)",
-        "High": "High (3 different)",
+@st.cache_data(max_entries=32, show_spinner=False)
+def chart_spec(counts):
+    """Vega-Lite spec for the stacked chart, cached per tuple of cell counts."""
+    import altair as alt
+
+    n_var = len(VARIETY_ORDER)
+    cells_by_cond = {
+        cond: counts[i * n_var:(i + 1) * n_var]
+        for i, cond in enumerate(CONDITION_ORDER)
+    }
+    n_by_cond = {cond: sum(cells) for cond, cells in cells_by_cond.items()}
+    cond_labels = {
+        "sequential": f"Sequential choices\n(n = {n_by_cond['sequential']})",
+        "simultaneous": f"Simultaneous choices\n(n = {n_by_cond['simultaneous']})",
     }
 
-    order_var = ["Low", "Medium", "High"]
-    order_cond = ["sequential", "simultaneous"]
+    rows = []
+    for cond, cells in cells_by_cond.items():
+        total = n_by_cond[cond] or 1
+        cum = 0
+        for rank, (v, n) in enumerate(zip(VARIETY_ORDER, cells)):
+            pct = n / total * 100
+            rows.append({
+                "group": cond_labels[cond],
+                "level": VARIETY_LABELS[v],
+                "rank": rank,
+                "pct": pct,
+                "mid": cum + pct / 2,
+                "label": f"{pct:.0f}%" if pct >= 6 else "",
+            })
+            cum += pct
+
+    data = alt.Data(values=rows)
+    x = alt.X(
+        "group:N",
+        sort=[cond_labels[c] for c in CONDITION_ORDER],
+        title=None,
+        axis=alt.Axis(labelAngle=0, labelExpr="split(datum.label, '\\n')"),
+    )
+    bars = alt.Chart(data).mark_bar().encode(
+        x=x,
+        y=alt.Y("pct:Q", stack="zero", scale=alt.Scale(domain=[0, 100]), title="%"),
+        color=alt.Color(
+            "level:N",
+            sort=[VARIETY_LABELS[v] for v in VARIETY_ORDER],
+            title=None,
+            legend=alt.Legend(orient="top-right"),
+        ),
+        order=alt.Order("rank:Q"),
+    )
+    text = alt.Chart(data).mark_text().encode(
+        x=x,
+        y=alt.Y("mid:Q"),
+        text="label:N",
+    )
 
-    if df.empty:
+    chart = (bars + text).properties(title="Amount of Variety Selected")
+    return chart.to_dict()
+
+def plot_stacked(df):
+    if df["n"].sum() == 0:
         st.info("No data yet.")
         return
 
-    for c in order_cond:
-        for v in order_var:
-            if not ((df.condition == c) & (df.variety == v)).any():
-                df = pd.concat(
-                    [df, pd.DataFrame([{"condition": c, "variety": v, "n": 0}])],
-                    ignore_index=True
-                )
-
     pivot = (
-        df.pivot_table(index="condition", columns="variety", values="n", aggfunc="sum")
-        .reindex(order_cond)
-        .reindex(columns=order_var)
-        .fillna(0)
+        df.pivot_table(index="condition", columns="variety", values="n",
+                       aggfunc="sum", fill_value=0)
+        .reindex(index=CONDITION_ORDER, columns=VARIETY_ORDER, fill_value=0)
     )
+    # Row sums of these counts are the per-condition n, so no extra query.
+    counts = tuple(int(n) for n in pivot.to_numpy().ravel())
 
-    perc = pivot.div(pivot.sum(axis=1).replace(0, 1), axis=0) * 100
+    st.vega_lite_chart(chart_spec(counts), use_container_width=True)
 
-    n_map = fetch_n_per_condition()
-    n_seq = n_map.get("sequential", 0)
-    n_sim = n_map.get("simultaneous", 0)
+@st.cache_resource(show_spinner=False)
+def load_image(path):
+    """Read an image once per process; the same bytes object is reused.
 
-    fig, ax = plt.subplots()
-    bottom = None
-
-    for v in order_var:
-        ax.bar(
-            perc.index,
-            perc[v],
-            bottom=bottom,
-            label=label_map[v],
-        )
-        bottom = perc[v] if bottom is None else bottom + perc[v]
-
-    ax.set_ylim(0, 100)
-    ax.set_ylabel("%")
-    ax.set_xticks([0, 1])
-    ax.set_xticklabels([
-        f"Sequential choices\n(n = {n_seq})",
-        f"Simultaneous choices\n(n = {n_sim})"
-    ])
-    ax.set_title("Amount of Variety Selected")
-    ax.legend(loc="upper right")
-
-    for i, cond in enumerate(order_cond):
-        cum = 0
-        for v in order_var:
-            val = perc.loc[cond, v]
-            if val >= 6:
-                ax.text(i, cum + val / 2, f"{val:.0f}%", ha="center", va="center")
-            cum += val
-
-    st.pyplot(fig)
+    A missing file raises instead of caching None, so it is picked up once
+    it appears.
+    """
+    with open(path, "rb") as f:
+        return f.read()
 
 def reset_data():
-    conn = get_conn()
-    with conn.cursor() as cur:
-        cur.execute("DELETE FROM yogurt_variety;")
+    with get_pool().connection() as conn, conn.transaction(), conn.cursor() as cur:
+        # TRUNCATE's exclusive lock waits out in-flight batches and holds off
+        # new ones until the counts are zeroed, so the two cannot drift apart.
+        cur.execute("TRUNCATE yogurt_variety;")
+        cur.execute("UPDATE yv_counts SET n = 0;")
+    fetch_counts.clear()
 
 # -----------------------------
 # Init DB
@@ -193,7 +426,7 @@ init_db()
 # Session state
 # -----------------------------
 if "pid" not in st.session_state:
-    st.session_state.pid = f"p_{random.randint(100000, 999999)}"
+    st.session_state.pid = f"p_{secrets.token_urlsafe(6)}"
 
 if "condition" not in st.session_state:
     st.session_state.condition = assign_condition_balanced()
@@ -206,8 +439,10 @@ admin = st.query_params.get("admin") == "1"
 # -----------------------------
 # UI
 # -----------------------------
-if os.path.exists("Bild1.png"):
-    st.image("Bild1.png", use_container_width=True)
+try:
+    st.image(load_image("Bild1.png"), use_container_width=True)
+except FileNotFoundError:
+    pass
 
 # ----- Admin block -----
 if admin:
@@ -224,74 +459,93 @@ if admin:
     st.markdown("---")
 
 # ----- Done screen -----
-if st.session_state.done:
+def done_screen():
     st.success("Thank you — your choices were recorded.")
 
     if SHOW_RESULTS_TO_STUDENTS or admin:
         with st.expander("See results so far", expanded=True):
             plot_stacked(fetch_counts())
 
+if st.session_state.done:
+    done_screen()
     st.stop()
 
 # ----- Experiment -----
-if st.session_state.condition == "sequential":
-    st.write(
-        "Imagine you are purchasing three cups of yogurt.\n\n"
-        "You choose **one yogurt each week**, for **three consecutive weeks**. "
-        "After each choice, assume you consume it. "
-        "Each week you choose again from the same set."
-    )
-    st.write("**Which yogurt would you choose each week?**")
-
-    with st.form("seq"):
-        w1 = st.selectbox("Week 1", OPTIONS)
-        w2 = st.selectbox("Week 2", OPTIONS)
-        w3 = st.selectbox("Week 3", OPTIONS)
-        submit = st.form_submit_button("Submit")
-
-        if submit:
-            choices = [w1, w2, w3]
-            if PLACEHOLDER in choices:
-                st.error("Please select a yogurt for all three weeks.")
-                st.stop()
-
-            safe_insert({
-                "created_at": datetime.now(timezone.utc),
-                "participant_id": st.session_state.pid,
-                "condition": "sequential",
-                "choices": choices,
-                "variety": classify_variety(choices),
-            })
-            st.session_state.done = True
-            st.rerun()
-
-else:
-    st.write(
-        "Imagine you are purchasing three cups of yogurt.\n\n"
-        "You choose **three yogurts at the same time**, "
-        "to be consumed over **three weeks** (one per week). "
-        "You may choose the same yogurt more than once."
-    )
-    st.write("**Which three yogurts would you choose?**")
-
-    with st.form("sim"):
-        s1 = st.selectbox("Yogurt 1", OPTIONS)
-        s2 = st.selectbox("Yogurt 2", OPTIONS)
-        s3 = st.selectbox("Yogurt 3", OPTIONS)
-        submit = st.form_submit_button("Submit")
-
-        if submit:
-            choices = [s1, s2, s3]
-            if PLACEHOLDER in choices:
-                st.error("Please select all three yogurts.")
-                st.stop()
-
-            safe_insert({
-                "created_at": datetime.now(timezone.utc),
-                "participant_id": st.session_state.pid,
-                "condition": "simultaneous",
-                "choices": choices,
-                "variety": classify_variety(choices),
-            })
-            st.session_state.done = True
-            st.rerun()
+# A fragment, so submitting reruns only this block instead of the whole script.
+@st.fragment
+def experiment_block():
+    if st.session_state.done:
+        done_screen()
+        return
+
+    if st.session_state.condition == "sequential":
+        st.write(
+            "Imagine you are purchasing three cups of yogurt.\n\n"
+            "You choose **one yogurt each week**, for **three consecutive weeks**. "
+            "After each choice, assume you consume it. "
+            "Each week you choose again from the same set."
+        )
+        st.write("**Which yogurt would you choose each week?**")
+
+        with st.form("seq"):
+            w1 = st.selectbox("Week 1", OPTIONS)
+            w2 = st.selectbox("Week 2", OPTIONS)
+            w3 = st.selectbox("Week 3", OPTIONS)
+            submit = st.form_submit_button("Submit")
+
+            if submit:
+                choices = [w1, w2, w3]
+                if PLACEHOLDER in choices:
+                    st.error("Please select a yogurt for all three weeks.")
+                    return
+
+                try:
+                    safe_insert({
+                        "created_at": datetime.now(timezone.utc),
+                        "participant_id": st.session_state.pid,
+                        "condition": "sequential",
+                        "choice_code": encode_choices(choices),
+                        "variety": classify_variety(choices),
+                    })
+                except (FutureTimeout, psycopg.Error):
+                    st.error("Sorry, your choices could not be saved. Please try again.")
+                    return
+                st.session_state.done = True
+                st.rerun(scope="fragment")
+
+    else:
+        st.write(
+            "Imagine you are purchasing three cups of yogurt.\n\n"
+            "You choose **three yogurts at the same time**, "
+            "to be consumed over **three weeks** (one per week). "
+            "You may choose the same yogurt more than once."
+        )
+        st.write("**Which three yogurts would you choose?**")
+
+        with st.form("sim"):
+            s1 = st.selectbox("Yogurt 1", OPTIONS)
+            s2 = st.selectbox("Yogurt 2", OPTIONS)
+            s3 = st.selectbox("Yogurt 3", OPTIONS)
+            submit = st.form_submit_button("Submit")
+
+            if submit:
+                choices = [s1, s2, s3]
+                if PLACEHOLDER in choices:
+                    st.error("Please select all three yogurts.")
+                    return
+
+                try:
+                    safe_insert({
+                        "created_at": datetime.now(timezone.utc),
+                        "participant_id": st.session_state.pid,
+                        "condition": "simultaneous",
+                        "choice_code": encode_choices(choices),
+                        "variety": classify_variety(choices),
+                    })
+                except (FutureTimeout, psycopg.Error):
+                    st.error("Sorry, your choices could not be saved. Please try again.")
+                    return
+                st.session_state.done = True
+                st.rerun(scope="fragment")
+
+experiment_block()